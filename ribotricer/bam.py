@@ -23,7 +23,7 @@ from tqdm.autonotebook import tqdm
 tqdm.pandas()
 
 
-def split_bam(bam_path, protocol, prefix, read_lengths=None):
+def split_bam(bam_path, protocol, prefix, read_lengths=None, threads=1):
     """Split bam by read length and strand
 
     Parameters
@@ -38,6 +38,8 @@ def split_bam(bam_path, protocol, prefix, read_lengths=None):
                   read lengths to use
                   If None, it will be automatically determined by assessing
                   the periodicity of metagene profile of this read length
+    threads: int
+             Number of htslib threads used to decompress the bam
 
     Returns
     -------
@@ -52,11 +54,11 @@ def split_bam(bam_path, protocol, prefix, read_lengths=None):
     # print('reading bam file...')
     # First pass just counts the reads
     # this is required to display a progress bar
-    bam = pysam.AlignmentFile(bam_path, "rb")
+    bam = pysam.AlignmentFile(bam_path, "rb", threads=threads)
     total_reads = bam.count(until_eof=True)
     bam.close()
     with tqdm(total=total_reads, unit="reads", leave=False) as pbar:
-        bam = pysam.AlignmentFile(bam_path, "rb")
+        bam = pysam.AlignmentFile(bam_path, "rb", threads=threads)
         for read in bam.fetch(until_eof=True):
             pbar.update()
             # Track if the current read is usable
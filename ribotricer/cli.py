@@ -196,6 +196,13 @@ def prepare_orfs_cmd(
     help=("Whether output all ORFs including those " "non-translating ones"),
     is_flag=True,
 )
+@click.option(
+    "--threads",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Number of threads used to read the BAM file and to score ORFs",
+)
 def detect_orfs_cmd(
     bam,
     ribotricer_index,
@@ -209,6 +216,7 @@ def detect_orfs_cmd(
     min_valid_codons_ratio,
     min_read_density,
     report_all,
+    threads,
 ):
     if not os.path.isfile(bam):
         sys.exit("Error: BAM file not found")
@@ -238,6 +246,9 @@ def detect_orfs_cmd(
         if not all(x > y for (x, y) in zip(read_lengths, psite_offsets)):
             sys.exit("Error: P-site offset must be smaller than read length")
         psite_offsets = dict(list(zip(read_lengths, psite_offsets)))
+    if threads < 1:
+        sys.exit("Error: threads must be at least 1")
+
     if stranded == "yes":
         stranded = "forward"
     detect_orfs(
@@ -253,6 +264,7 @@ def detect_orfs_cmd(
         min_valid_codons_ratio,
         min_read_density,
         report_all,
+        threads,
     )
 
 
@@ -18,6 +18,8 @@ import pathlib
 import sys
 from .interval import Interval
 
+import numpy as np
+
 # Source: https://broadinstitute.github.io/picard/explain-flags.html
 __SAM_NOT_UNIQ_FLAGS__ = [4, 20, 256, 272, 2048]
 
@@ -114,16 +116,48 @@ def _clean_input(comma_string):
 def collapse_coverage_to_codon(coverage):
     """Collapse nucleotide level coverage to codon level.
 
-  Parameters
-  ----------
-  coverage: list
-            Nucleotide level counts 
-  Returns
-  -------
-  codon_coverage: list
-                  Coverage collapsed to codon level
-  """
-    codon_coverage = [
-        sum(coverage[current : current + 3]) for current in range(0, len(coverage), 3)
-    ]
-    return codon_coverage
+    Parameters
+    ----------
+    coverage: array like
+              Nucleotide level counts
+
+    Returns
+    -------
+    codon_coverage: np.ndarray
+                    Coverage collapsed to codon level
+    """
+    coverage = np.asarray(coverage, dtype=np.int64)
+    if coverage.size == 0:
+        return coverage
+    return np.add.reduceat(coverage, np.arange(0, coverage.size, 3))
+
+
+def counter_to_arrays(counter):
+    """Convert a Counter keyed by (chrom, pos) to numpy arrays.
+
+    Parameters
+    ----------
+    counter: Counter
+             counts keyed by (chrom, pos)
+
+    Returns
+    -------
+    chroms: list
+            chrom names, indexed by chrom_codes
+    chrom_codes: np.ndarray
+                 code of the chrom of each key
+    positions: np.ndarray
+               position of each key
+    counts: np.ndarray
+            count of each key
+    """
+    n_keys = len(counter)
+    chrom_index = {}
+    chrom_codes = np.fromiter(
+        (chrom_index.setdefault(chrom, len(chrom_index)) for chrom, _ in counter),
+        dtype=np.int32,
+        count=n_keys,
+    )
+    positions = np.fromiter((pos for _, pos in counter), dtype=np.int64, count=n_keys)
+    counts = np.fromiter(counter.values(), dtype=np.int32, count=n_keys)
+    return list(chrom_index), chrom_codes, positions, counts
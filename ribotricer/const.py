@@ -15,6 +15,9 @@
 
 # ribotricer default cutoff for lavbeling ORFs 'translating'
 CUTOFF = 0.428571428571
+# numba phase scores closer than this to CUTOFF are recomputed
+# with phasescore before labeling the ORF
+PHASE_SCORE_TOLERANCE = 1e-9
 # p-site offset
 TYPICAL_OFFSET = 12
 # minimum number of valid codons required in an ORF to label
@@ -29,3 +32,5 @@ MINIMUM_VALID_CODONS_RATIO = 0
 # Minimum read density over ORF
 # defined as the number of reads per unit length of the ORF
 MINIMUM_DENSITY_OVER_ORF = 0.0
+# number of ORFs scored together when exporting coverages
+ORF_BATCH_SIZE = 10000
@@ -14,6 +14,8 @@
 # GNU General Public License for more details.
 
 from .statistics import phasescore
+from .statistics import orf_phasescores
+from .statistics import _NUMBA_AVAILABLE
 from .plotting import plot_metagene
 from .plotting import plot_read_lengths
 from .orf import ORF
@@ -25,14 +27,23 @@ from .const import MINIMUM_READS_PER_CODON
 from .const import MINIMUM_VALID_CODONS_RATIO
 from .const import MINIMUM_VALID_CODONS
 from .const import CUTOFF
+from .const import PHASE_SCORE_TOLERANCE
+from .const import ORF_BATCH_SIZE
 from .common import parent_dir
 from .common import mkdir_p
+from .common import path_leaf
 from .common import collapse_coverage_to_codon
+from .common import counter_to_arrays
 from .bam import split_bam
 from quicksect import Interval, IntervalTree
-from collections import Counter
 from collections import defaultdict
+from itertools import groupby
+from multiprocessing import Pool
 import datetime
+import os
+import shutil
+import sys
+import tempfile
 
 import numpy as np
 from tqdm.autonotebook import tqdm
@@ -43,6 +54,29 @@ tqdm.pandas()
 # Required for IntervalTree
 STRAND_TO_NUM = {"+": 1, "-": -1}
 
+ORF_TABLE_COLUMNS = [
+    "ORF_ID",
+    "ORF_type",
+    "status",
+    "phase_score",
+    "read_count",
+    "length",
+    "valid_codons",
+    "valid_codons_ratio",
+    "read_density",
+    "transcript_id",
+    "transcript_type",
+    "gene_id",
+    "gene_name",
+    "gene_type",
+    "chrom",
+    "strand",
+    "start_codon",
+    "profile",
+]
+# %-formatting is faster than str.format for the per-ORF rows
+ORF_TABLE_FORMATTER = "%s\t" * (len(ORF_TABLE_COLUMNS) - 1) + "%s\n"
+
 
 def merge_read_lengths(alignments, psite_offsets):
     """
@@ -57,22 +91,91 @@ def merge_read_lengths(alignments, psite_offsets):
                    key is the length, value is the offset
     Returns
     -------
-    merged_alignments: dict(dict)
-                       alignments by merging all lengths
+    merged_alignments: dict(dict(tuple))
+                       alignments by merging all lengths, key is the strand,
+                       then the chrom, value is (positions, counts) with
+                       positions sorted and unique
     """
     # print('merging different lengths...')
-    merged_alignments = defaultdict(Counter)
-
+    shifted = defaultdict(list)
     for length, offset in list(psite_offsets.items()):
         for strand in alignments[length]:
-            for chrom, pos in alignments[length][strand]:
-                count = alignments[length][strand][(chrom, pos)]
-                if strand == "+":
-                    pos_shifted = pos + offset
-                else:
-                    pos_shifted = pos - offset
-                merged_alignments[strand][(chrom, pos_shifted)] += count
-    return merged_alignments
+            counter = alignments[length][strand]
+            if not counter:
+                continue
+            # P-sites are downstream of the 5' end on either strand
+            sign = 1 if strand == "+" else -1
+            chroms, chrom_codes, positions, counts = counter_to_arrays(counter)
+            positions += sign * offset
+            # split the keys by chrom with one sort
+            order = np.argsort(chrom_codes, kind="stable")
+            bounds = np.searchsorted(chrom_codes[order], np.arange(len(chroms) + 1))
+            for code, chrom in enumerate(chroms):
+                in_chrom = order[bounds[code] : bounds[code + 1]]
+                shifted[(strand, chrom)].append((positions[in_chrom], counts[in_chrom]))
+
+    merged_alignments = defaultdict(dict)
+    for strand, chrom in list(shifted):
+        parts = shifted.pop((strand, chrom))
+        positions = np.concatenate([pos for pos, _ in parts])
+        counts = np.concatenate([count for _, count in parts])
+        # shifted positions can fall off the start of the chromosome
+        keep = positions >= 0
+        positions, counts = positions[keep], counts[keep]
+        order = np.argsort(positions, kind="stable")
+        positions, first = np.unique(positions[order], return_index=True)
+        if positions.size:
+            counts = np.add.reduceat(counts[order], first)
+        merged_alignments[strand][chrom] = (positions, counts)
+    return dict(merged_alignments)
+
+
+def build_coverage_arrays(merged_alignments, memmap_dir=None):
+    """
+    Scatter merged alignments into dense coverage arrays.
+
+    Parameters
+    ----------
+    merged_alignments: dict(dict(tuple))
+                       see build_coverage_arrays
+    memmap_dir: str
+                if given, the coverage of each strand is written
+                to one {pos,neg}.i32 file in this directory and the
+                chroms are returned as views of its read-only memory map
+    Returns
+    -------
+    coverage_arrays: dict(dict(np.ndarray))
+                     key is the strand, then the chrom,
+                     value is the count indexed by position
+    """
+    # all chromosomes of a strand share one buffer, so memory mapping
+    # costs a single file and mapping per strand
+    coverage_arrays = {}
+    for strand, chroms in merged_alignments.items():
+        lengths = [
+            int(positions[-1]) + 1 if positions.size else 1
+            for positions, _ in chroms.values()
+        ]
+        starts = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+        if memmap_dir is None:
+            coverage = np.zeros(starts[-1], dtype=np.int32)
+        else:
+            filename = os.path.join(
+                memmap_dir, "{}.i32".format("pos" if strand == "+" else "neg")
+            )
+            coverage = np.memmap(filename, dtype=np.int32, mode="w+", shape=starts[-1])
+        for (positions, counts), start in zip(chroms.values(), starts):
+            coverage[positions + start] = counts
+        if memmap_dir is not None:
+            coverage.flush()
+            del coverage
+            # pages are only read back when an ORF touches them
+            coverage = np.memmap(filename, dtype=np.int32, mode="r")
+        coverage_arrays[strand] = {
+            chrom: coverage[start : start + length]
+            for chrom, start, length in zip(chroms, starts, lengths)
+        }
+    return coverage_arrays
 
 
 def parse_ribotricer_index(ribotricer_index):
@@ -98,19 +201,13 @@ def parse_ribotricer_index(ribotricer_index):
     annotated = []
     refseq = defaultdict(IntervalTree)
 
-    # First count the number of
-    # annotated regions to count.
     # The annotated regions appear first in the index file
     # so need to read only upto a point where the regions
     # no longer have the annotated tag.
-    total_lines = 0
+    # Their number is not known upfront, so the progress bar
+    # has no total rather than scanning the file twice.
     with open(ribotricer_index, "r") as anno:
-        # read header
-        anno.readline()
-        while "annotated" in anno.readline():
-            total_lines += 1
-    with open(ribotricer_index, "r") as anno:
-        with tqdm(total=total_lines, unit="lines", leave=False) as pbar:
+        with tqdm(unit="lines", leave=False) as pbar:
             # read header
             anno.readline()
             line = anno.readline()
@@ -130,14 +227,31 @@ def parse_ribotricer_index(ribotricer_index):
     return (annotated, refseq)
 
 
-def orf_coverage(orf, alignments, offset_5p=0, offset_3p=0):
+def _slice_coverage(chrom_coverage, start, end):
+    """Coverage over [start, end], zero-padded outside the array"""
+    length = end - start + 1
+    if length <= 0:
+        return np.zeros(0, dtype=np.int32)
+    if chrom_coverage is None:
+        return np.zeros(length, dtype=np.int32)
+    if start >= 0 and end < len(chrom_coverage):
+        return chrom_coverage[start : end + 1]
+    coverage = np.zeros(length, dtype=np.int32)
+    lo, hi = max(start, 0), min(end + 1, len(chrom_coverage))
+    if lo < hi:
+        coverage[lo - start : hi - start] = chrom_coverage[lo:hi]
+    return coverage
+
+
+def orf_coverage(orf, coverage_arrays, offset_5p=0, offset_3p=0):
     """
     Parameters
     ----------
     orf: ORF
          instance of ORF
-    alignments: dict(Counter)
-                alignments summarized from bam by merging lengths
+    coverage_arrays: dict(dict(np.ndarray))
+                     dense coverage by strand and chrom,
+                     see build_coverage_arrays
     offset_5p: int
                the number of nts to include from 5'prime
     offset_3p: int
@@ -145,60 +259,253 @@ def orf_coverage(orf, alignments, offset_5p=0, offset_3p=0):
 
     Returns
     -------
-    coverage: array
+    coverage: np.ndarray
               coverage for ORF
     """
-    coverage = []
-    chrom = orf.chrom
     strand = orf.strand
     if strand == "-":
         offset_5p, offset_3p = offset_3p, offset_5p
+    chrom_coverage = coverage_arrays.get(strand, {}).get(orf.chrom)
     first, last = orf.intervals[0], orf.intervals[-1]
-    for pos in range(first.start - offset_5p, first.start):
-        if orf.category == "annotated":
-            try:
-                coverage.append(alignments[strand][(chrom, pos)])
-            except KeyError:
-                coverage.append(0)
-        else:
-            if strand in alignments and (chrom, pos) in alignments[strand]:
-                coverage.append(alignments[strand][(chrom, pos)])
-            else:
-                coverage.append(0)
-
+    segments = [
+        _slice_coverage(chrom_coverage, first.start - offset_5p, first.start - 1)
+    ]
     for interval in orf.intervals:
-        for pos in range(interval.start, interval.end + 1):
-            if orf.category == "annotated":
-                try:
-                    coverage.append(alignments[strand][(chrom, pos)])
-                except KeyError:
-                    coverage.append(0)
-            else:
-                if strand in alignments and (chrom, pos) in alignments[strand]:
-                    coverage.append(alignments[strand][(chrom, pos)])
-                else:
-                    coverage.append(0)
-
-    for pos in range(last.end + 1, last.end + offset_3p + 1):
-        if orf.category == "annotated":
-            try:
-                coverage.append(alignments[strand][(chrom, pos)])
-            except KeyError:
-                coverage.append(0)
-        else:
-            if strand in alignments and (chrom, pos) in alignments[strand]:
-                coverage.append(alignments[strand][(chrom, pos)])
-            else:
-                coverage.append(0)
+        segments.append(_slice_coverage(chrom_coverage, interval.start, interval.end))
+    segments.append(_slice_coverage(chrom_coverage, last.end + 1, last.end + offset_3p))
+    coverage = np.concatenate(segments)
 
     if strand == "-":
-        coverage.reverse()
+        coverage = coverage[::-1]
     return coverage
 
 
+def _orf_stats(orfs, order, coverage_arrays):
+    """(phase score, valid codons, read count, length, lowest codon coverage)
+    of each ORF, computed in the given order
+    """
+    stats = [None] * len(orfs)
+    for i in order:
+        cov = orf_coverage(orfs[i], coverage_arrays)
+        coh, valid_codons = phasescore(cov.tolist())
+        codon_coverage = collapse_coverage_to_codon(cov)
+        min_codon = int(codon_coverage.min()) if codon_coverage.size else 0
+        stats[i] = (coh, valid_codons, int(cov.sum()), cov.size, min_codon)
+    return stats
+
+
+def _fused_orf_stats(orfs, order, coverage_arrays):
+    """Same as _orf_stats, but scores each run of ORFs sharing a
+    chromosome and strand in one numba pass over its coverage array.
+    Phase scores are only accurate to rounding error, so score_orfs
+    recomputes the ones it writes or that are close to the cutoff.
+    This only saves work when most ORFs are not written, which is why
+    score_orfs does not use it with report_all
+    """
+    stats = [None] * len(orfs)
+    empty = np.zeros(0, dtype=np.int32)
+    for (chrom, strand), group in groupby(
+        order, key=lambda i: (orfs[i].chrom, orfs[i].strand)
+    ):
+        group = list(group)
+        starts, ends, offsets = [], [], [0]
+        for i in group:
+            for interval in orfs[i].intervals:
+                starts.append(interval.start)
+                ends.append(interval.end)
+            offsets.append(len(starts))
+        chrom_coverage = coverage_arrays.get(strand, {}).get(chrom)
+        results = orf_phasescores(
+            empty if chrom_coverage is None else chrom_coverage,
+            np.array(starts, dtype=np.int64),
+            np.array(ends, dtype=np.int64),
+            np.array(offsets, dtype=np.int64),
+            strand == "-",
+        )
+        coh, valid, tie, count, length, min_codon = (a.tolist() for a in results)
+        for k, i in enumerate(group):
+            if tie[k]:
+                cov = orf_coverage(orfs[i], coverage_arrays)
+                coh[k], valid[k] = phasescore(cov.tolist())
+            stats[i] = (coh[k], valid[k], count[k], length[k], min_codon[k])
+    return stats
+
+
+def score_orfs(
+    orfs,
+    coverage_arrays,
+    phase_score_cutoff=CUTOFF,
+    min_valid_codons=MINIMUM_VALID_CODONS,
+    min_reads_per_codon=MINIMUM_READS_PER_CODON,
+    min_valid_codons_ratio=MINIMUM_VALID_CODONS_RATIO,
+    min_density_over_orf=MINIMUM_DENSITY_OVER_ORF,
+    report_all=False,
+):
+    """
+    Parameters
+    ----------
+    orfs: List[ORF]
+          ORFs to score
+    coverage_arrays: dict(dict(np.ndarray))
+                     dense coverage by strand and chrom,
+                     see build_coverage_arrays
+    report_all: bool
+                if True, rows for nontranslating ORFs are also returned
+
+    Returns
+    -------
+    rows: List[str]
+          formatted output rows in the order of orfs
+    """
+    # score ORFs in genomic order so each chromosome's array is
+    # read in one sweep instead of jumping between chromosomes,
+    # rows are still returned in the order of orfs
+    order = sorted(
+        range(len(orfs)),
+        key=lambda i: (orfs[i].chrom, orfs[i].strand, orfs[i].intervals[0].start),
+    )
+    # with report_all every row is written with phasescore's exact score,
+    # so the numba kernel would only add work
+    fused = _NUMBA_AVAILABLE and not report_all
+    if fused:
+        stats = _fused_orf_stats(orfs, order, coverage_arrays)
+    else:
+        stats = _orf_stats(orfs, order, coverage_arrays)
+    rows = []
+    for orf, (coh, valid_codons, count, length, min_codon) in zip(orfs, stats):
+        n_codons = max(1, length // 3)
+        valid_codons_ratio = valid_codons / n_codons
+        # total reads in the ORF divided by the length
+        orf_density = count / n_codons
+        passes_filters = (
+            valid_codons >= min_valid_codons
+            and (length == 0 or min_codon >= min_reads_per_codon)
+            and valid_codons_ratio >= min_valid_codons_ratio
+            and orf_density >= min_density_over_orf
+        )
+        coverage = None
+        if (
+            fused
+            and passes_filters
+            and coh >= phase_score_cutoff - PHASE_SCORE_TOLERANCE
+        ):
+            # the numba phase score can differ from phasescore in the last
+            # digits, so the exact score is used for every ORF that is
+            # written or close enough to the cutoff to flip its status
+            coverage = orf_coverage(orf, coverage_arrays)
+            coh = phasescore(coverage.tolist())[0]
+        status = (
+            "translating"
+            if coh >= phase_score_cutoff and passes_filters
+            else "nontranslating"
+        )
+        # skip outputing nontranslating ones
+        if not report_all and status == "nontranslating":
+            continue
+        rows.append(
+            ORF_TABLE_FORMATTER
+            % (
+                orf.oid,
+                orf.category,
+                status,
+                coh,
+                count,
+                length,
+                valid_codons,
+                valid_codons_ratio,
+                orf_density,
+                orf.tid,
+                orf.ttype,
+                orf.gid,
+                orf.gname,
+                orf.gtype,
+                orf.chrom,
+                orf.strand,
+                orf.start_codon,
+                (
+                    orf_coverage(orf, coverage_arrays) if coverage is None else coverage
+                ).tolist(),
+            )
+        )
+    return rows
+
+
+# coverage arrays and thresholds of the worker processes,
+# set once per process by _init_score_worker
+_worker_state = {}
+
+
+def _share_coverage(coverage_arrays):
+    """Replace memory-mapped coverage arrays by (file name, start, stop),
+    pickling a memmap would copy its whole content to the workers
+    """
+    shared = {}
+    for strand, chroms in coverage_arrays.items():
+        shared[strand] = {}
+        for chrom, cov in chroms.items():
+            if isinstance(cov, np.memmap):
+                start = 0
+                if isinstance(cov.base, np.memmap):
+                    start = (cov.ctypes.data - cov.base.ctypes.data) // cov.itemsize
+                cov = (cov.filename, start, start + cov.size)
+            shared[strand][chrom] = cov
+    return shared
+
+
+def _init_score_worker(coverage_arrays, thresholds):
+    # each file is mapped once, chromosomes are views of it
+    maps = {}
+    _worker_state["coverage_arrays"] = {}
+    for strand, chroms in coverage_arrays.items():
+        _worker_state["coverage_arrays"][strand] = {}
+        for chrom, cov in chroms.items():
+            if isinstance(cov, tuple):
+                filename, start, stop = cov
+                if filename not in maps:
+                    maps[filename] = np.memmap(filename, dtype=np.int32, mode="r")
+                cov = maps[filename][start:stop]
+            _worker_state["coverage_arrays"][strand][chrom] = cov
+    _worker_state["thresholds"] = thresholds
+    if _NUMBA_AVAILABLE:
+        import numba
+
+        # the pool already spreads batches over the cores
+        numba.set_num_threads(1)
+
+
+class _ScoreWorkerExit(Exception):
+    """sys.exit raised inside a worker process"""
+
+
+def _score_orf_lines(lines):
+    """Score a batch of index lines inside a worker process"""
+    try:
+        orfs = [ORF.from_string(line) for line in lines]
+    except SystemExit as e:
+        # SystemExit kills the worker and the pool replaces it,
+        # imap would then wait for this batch forever
+        raise _ScoreWorkerExit(str(e))
+    rows = score_orfs(
+        orfs, _worker_state["coverage_arrays"], *_worker_state["thresholds"]
+    )
+    return sum(map(len, lines)), rows
+
+
+def _batch_lines(handle, batch_size):
+    """Yield lists of at most batch_size lines from handle"""
+    batch = []
+    for line in handle:
+        batch.append(line)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 def export_orf_coverages(
     ribotricer_index,
-    merged_alignments,
+    coverage_arrays,
     prefix,
     phase_score_cutoff=CUTOFF,
     min_valid_codons=MINIMUM_VALID_CODONS,
@@ -206,129 +513,107 @@ def export_orf_coverages(
     min_valid_codons_ratio=MINIMUM_VALID_CODONS_RATIO,
     min_density_over_orf=MINIMUM_DENSITY_OVER_ORF,
     report_all=False,
+    threads=1,
 ):
     """
     Parameters
     ----------
     ribotricer_index: str
                    Path to the index file generated by ribotricer prepare_orfs
-    merged_alignments: dict(dict)
-                       alignments by merging all lengths
+    coverage_arrays: dict(dict(np.ndarray))
+                     dense coverage by strand and chrom,
+                     see build_coverage_arrays
     prefix: str
             prefix for output file
     report_all: bool
                 if True, all coverages will be exported
+    threads: int
+             number of processes used to score ORFs,
+             or of numba threads if numba is installed
+             and report_all is False
     """
     # print('exporting coverages for all ORFs...')
-    columns = [
-        "ORF_ID",
-        "ORF_type",
-        "status",
-        "phase_score",
-        "read_count",
-        "length",
-        "valid_codons",
-        "valid_codons_ratio",
-        "read_density",
-        "transcript_id",
-        "transcript_type",
-        "gene_id",
-        "gene_name",
-        "gene_type",
-        "chrom",
-        "strand",
-        "start_codon",
-        "profile\n",
-    ]
-    to_write = "\t".join(columns)
-    formatter = "{}\t" * (len(columns) - 1) + "{}\n"
-    with open(ribotricer_index, "r") as anno:
-        total_lines = len(["" for line in anno])
-
+    thresholds = (
+        phase_score_cutoff,
+        min_valid_codons,
+        min_reads_per_codon,
+        min_valid_codons_ratio,
+        min_density_over_orf,
+        report_all,
+    )
     with open(ribotricer_index, "r") as anno, open(
         "{}_translating_ORFs.tsv".format(prefix), "w"
     ) as output:
-        output.write(to_write)
-        with tqdm(total=total_lines, unit="ORFs") as pbar:
+        output.write("\t".join(ORF_TABLE_COLUMNS) + "\n")
+        # progress is tracked in bytes of the index file,
+        # so the file is read only once
+        total_bytes = os.path.getsize(ribotricer_index)
+        with tqdm(total=total_bytes, unit="B", unit_scale=True) as pbar:
             # Skip header
-            anno.readline()
-            for line in anno:
-                pbar.update()
-                orf = ORF.from_string(line)
-                cov = orf_coverage(orf, merged_alignments)
-                count = sum(cov)
-                length = len(cov)
-                coh, valid_codons = phasescore(cov)
-                n_codons = max(1, length // 3)
-
-                # codon level coverage
-                codon_coverage = np.array(collapse_coverage_to_codon(cov))
-                valid_codons_ratio = valid_codons / n_codons
-                # total reads in the ORF divided by the length
-                orf_density = np.sum(codon_coverage) / n_codons
-                codon_coverage_exceeds_min = codon_coverage >= min_reads_per_codon
-                status = (
-                    "translating"
-                    if (
-                        coh >= phase_score_cutoff
-                        and valid_codons >= min_valid_codons
-                        and np.all(codon_coverage_exceeds_min)
-                        and valid_codons_ratio >= min_valid_codons_ratio
-                        and orf_density >= min_density_over_orf
-                    )
-                    else "nontranslating"
-                )
-                # skip outputing nontranslating ones
-                if not report_all and status == "nontranslating":
-                    pass
-                else:
-                    to_write = formatter.format(
-                        orf.oid,
-                        orf.category,
-                        status,
-                        coh,
-                        count,
-                        length,
-                        valid_codons,
-                        valid_codons_ratio,
-                        orf_density,
-                        orf.tid,
-                        orf.ttype,
-                        orf.gid,
-                        orf.gname,
-                        orf.gtype,
-                        orf.chrom,
-                        orf.strand,
-                        orf.start_codon,
-                        cov,
-                    )
-                    output.write(to_write)
+            pbar.update(len(anno.readline()))
+            batches = _batch_lines(anno, ORF_BATCH_SIZE)
+            # without report_all, numba scores each batch on its own
+            # threads and no worker processes are needed
+            numba_threads = _NUMBA_AVAILABLE and not report_all
+            if threads > 1 and not numba_threads:
+                # workers receive the coverage arrays once at startup,
+                # only index lines and output rows are sent per batch
+                with Pool(
+                    threads,
+                    initializer=_init_score_worker,
+                    initargs=(_share_coverage(coverage_arrays), thresholds),
+                ) as pool:
+                    try:
+                        for size, rows in pool.imap(_score_orf_lines, batches):
+                            output.writelines(rows)
+                            pbar.update(size)
+                    except _ScoreWorkerExit as e:
+                        sys.exit(str(e))
+            else:
+                if _NUMBA_AVAILABLE:
+                    import numba
+
+                    # numba would otherwise use every core,
+                    # the caller's setting is restored afterwards
+                    previous_threads = numba.get_num_threads()
+                    numba.set_num_threads(min(threads, numba.config.NUMBA_NUM_THREADS))
+                try:
+                    for lines in batches:
+                        orfs = [ORF.from_string(line) for line in lines]
+                        output.writelines(
+                            score_orfs(orfs, coverage_arrays, *thresholds)
+                        )
+                        pbar.update(sum(map(len, lines)))
+                finally:
+                    if _NUMBA_AVAILABLE:
+                        numba.set_num_threads(previous_threads)
 
 
 def export_wig(merged_alignments, prefix):
     """
     Parameters
     ----------
-    merged_alignments: dict(dict)
-                       alignments by merging all lengths
+    merged_alignments: dict(dict(tuple))
+                       alignments by merging all lengths,
+                       see merge_read_lengths
     prefix: str
             prefix of output wig files
     """
     # print('exporting merged alignments to wig file...')
     for strand in merged_alignments:
-        to_write = ""
-        cur_chrom = ""
-        for chrom, pos in sorted(merged_alignments[strand]):
-            if chrom != cur_chrom:
-                cur_chrom = chrom
-                to_write += "variableStep chrom={}\n".format(chrom)
-            to_write += "{}\t{}\n".format(pos, merged_alignments[strand][(chrom, pos)])
         if strand == "+":
             fname = "{}_pos.wig".format(prefix)
         else:
             fname = "{}_neg.wig".format(prefix)
         with open(fname, "w") as output:
-            output.write(to_write)
+            for chrom in sorted(merged_alignments[strand]):
+                positions, counts = merged_alignments[strand][chrom]
+                if not positions.size:
+                    continue
+                output.write("variableStep chrom={}\n".format(chrom))
+                output.write(
+                    "".join(map("{}\t{}\n".format, positions.tolist(), counts.tolist()))
+                )
 
 
 def detect_orfs(
@@ -344,6 +629,7 @@ def detect_orfs(
     min_valid_codons_ratio,
     min_density_over_orf,
     report_all,
+    threads=1,
 ):
     """
     Parameters
@@ -371,6 +657,9 @@ def detect_orfs(
     report_all: bool
                 Whether to output all ORFs' scores regardless of translation
                 status
+    threads: int
+             Number of threads used to decompress the bam
+             and to score ORFs
     """
     now = datetime.datetime.now()
     print(now.strftime("%b %d %H:%M:%S ..... started ribotricer detect-orfs"))
@@ -391,13 +680,15 @@ def detect_orfs(
                 now.strftime("%b %d %H:%M:%S"), "started inferring experimental design"
             )
         )
-        protocol = infer_protocol(bam, refseq, prefix)
+        protocol = infer_protocol(bam, refseq, prefix, threads=threads)
     del refseq
 
     # split bam file into strand and read length
     now = datetime.datetime.now()
     print(now.strftime("%b %d %H:%M:%S ... started reading bam file"))
-    alignments, read_length_counts = split_bam(bam, protocol, prefix, read_lengths)
+    alignments, read_length_counts = split_bam(
+        bam, protocol, prefix, read_lengths, threads
+    )
 
     # plot read length distribution
     now = datetime.datetime.now()
@@ -452,6 +743,7 @@ def detect_orfs(
         )
     )
     merged_alignments = merge_read_lengths(alignments, psite_offsets)
+    del alignments
 
     # export wig file
     now = datetime.datetime.now()
@@ -471,17 +763,30 @@ def detect_orfs(
             "started calculating phase scores for each ORF",
         )
     )
-    export_orf_coverages(
-        ribotricer_index,
-        merged_alignments,
-        prefix,
-        phase_score_cutoff,
-        min_valid_codons,
-        min_reads_per_codon,
-        min_valid_codons_ratio,
-        min_density_over_orf,
-        report_all,
+    # the coverage lives in memory maps next to the output,
+    # so only the chromosome slices read by ORFs are paged in
+    coverage_dir = tempfile.mkdtemp(
+        prefix="{}_coverage_".format(path_leaf(prefix)),
+        dir=os.path.abspath(parent_dir(prefix)),
     )
+    try:
+        coverage_arrays = build_coverage_arrays(merged_alignments, coverage_dir)
+        del merged_alignments
+        export_orf_coverages(
+            ribotricer_index,
+            coverage_arrays,
+            prefix,
+            phase_score_cutoff,
+            min_valid_codons,
+            min_reads_per_codon,
+            min_valid_codons_ratio,
+            min_density_over_orf,
+            report_all,
+            threads,
+        )
+        del coverage_arrays
+    finally:
+        shutil.rmtree(coverage_dir, ignore_errors=True)
     now = datetime.datetime.now()
     print(
         "{} ... {}".format(
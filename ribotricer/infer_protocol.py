@@ -13,17 +13,14 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 # GNU General Public License for more details.
 
-from collections import Counter
 from .common import is_read_uniq_mapping
 
+import numpy as np
 import pysam
 from quicksect import Interval
 
-# required to convert numeric strands to '+/-'
-NUM_TO_STRAND = {1: "+", -1: "-"}
 
-
-def infer_protocol(bam, gene_interval_tree, prefix, n_reads=20000):
+def infer_protocol(bam, gene_interval_tree, prefix, n_reads=20000, threads=1):
     """Infer strandedness protocol given a bam file
 
     Parameters
@@ -36,6 +33,8 @@ def infer_protocol(bam, gene_interval_tree, prefix, n_reads=20000):
             Prefix for protocol file
     n_reads: int
              Number of reads to use (downsampled)
+    threads: int
+             Number of htslib threads used to decompress the bam
 
     Returns
     -------
@@ -55,42 +54,35 @@ def infer_protocol(bam, gene_interval_tree, prefix, n_reads=20000):
 
     """
     iteration = 0
-    bam = pysam.AlignmentFile(bam, "rb")
-    strandedness = Counter()
+    bam = pysam.AlignmentFile(bam, "rb", threads=threads)
+    # count table for mapped strand vs gene strand, indexed by
+    # (mapped strand is '-') << 1 | (gene strand is '-'),
+    # that is ++, +-, -+, -- in order
+    strandedness = np.zeros(4, dtype=np.int64)
     for read in bam.fetch(until_eof=True):
-        if iteration <= n_reads:
-            if is_read_uniq_mapping(read):
-                if read.is_reverse:
-                    mapped_strand = "-"
-                else:
-                    mapped_strand = "+"
-                mapped_start = read.reference_start
-                mapped_end = read.reference_end
-                chrom = read.reference_name
-                # get corresponding gene's strand
-                interval = list(
-                    set(
-                        gene_interval_tree[chrom].find(
-                            Interval(mapped_start, mapped_end)
-                        )
-                    )
-                )
-                if len(interval) == 1:
-                    # Filter out genes with ambiguous strand info
-                    # (those) that have a tx_start on opposite strands
-                    gene_strand = NUM_TO_STRAND[interval[0].data]
-                    # count table for mapped strand vs gene strand
-                    strandedness["{}{}".format(mapped_strand, gene_strand)] += 1
-                    iteration += 1
+        if iteration > n_reads:
+            break
+        if is_read_uniq_mapping(read):
+            mapped_start = read.reference_start
+            mapped_end = read.reference_end
+            chrom = read.reference_name
+            # get corresponding gene's strand
+            interval = list(
+                set(gene_interval_tree[chrom].find(Interval(mapped_start, mapped_end)))
+            )
+            if len(interval) == 1:
+                # Filter out genes with ambiguous strand info
+                # (those) that have a tx_start on opposite strands
+                gene_strand = interval[0].data
+                strandedness[(read.is_reverse << 1) | (gene_strand == -1)] += 1
+                iteration += 1
+    bam.close()
     # Add pseudocounts
-    strandedness["++"] += 1
-    strandedness["--"] += 1
-    strandedness["+-"] += 1
-    strandedness["-+"] += 1
+    strandedness += 1
 
-    total = sum(strandedness.values())
-    forward_mapped_reads = strandedness["++"] + strandedness["--"]
-    reverse_mapped_reads = strandedness["-+"] + strandedness["+-"]
+    total = strandedness.sum()
+    forward_mapped_reads = strandedness[0] + strandedness[3]
+    reverse_mapped_reads = strandedness[2] + strandedness[1]
     to_write = (
         "In total {} reads checked:\n"
         '\tNumber of reads explained by "++, --": {} ({:.4f})\n'
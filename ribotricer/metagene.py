@@ -17,7 +17,7 @@ from .statistics import phasescore
 from .interval import Interval
 from .const import CUTOFF, TYPICAL_OFFSET
 import sys
-from collections import Counter, OrderedDict
+from collections import OrderedDict
 
 import numpy as np
 import pandas as pd
@@ -74,10 +74,12 @@ def orf_coverage_length(
 
     Returns
     -------
-    from_start: Series
-                coverage for ORF for specific length aligned at start codon
-    from_stop: Series
-               coverage for ORF for specific length aligned at stop codon
+    coverage: np.ndarray
+              coverage for ORF for specific length
+    start_first: int
+                 position of the first element relative to the start codon
+    stop_last: int
+               position of the last element relative to the stop codon
     """
     coverage = []
     chrom = orf.chrom
@@ -85,32 +87,17 @@ def orf_coverage_length(
     if strand == "-":
         offset_5p, offset_3p = offset_3p, offset_5p
 
+    # bind lookups once, the loop runs for every position
+    get = alignments[length][strand].get
+    append = coverage.append
     for pos in next_genome_pos(
         orf.intervals, max_positions, offset_5p, offset_3p, strand == "-"
     ):
-        try:
-            coverage.append(alignments[length][strand][(chrom, pos)])
-        except KeyError:
-            coverage.append(0)
+        append(get((chrom, pos), 0))
 
     if strand == "-":
-        from_start = pd.Series(
-            np.array(coverage), index=np.arange(-offset_3p, len(coverage) - offset_3p)
-        )
-        from_stop = pd.Series(
-            np.array(coverage),
-            index=np.arange(offset_5p - len(coverage) + 1, offset_5p + 1),
-        )
-    else:
-        from_start = pd.Series(
-            np.array(coverage), index=np.arange(-offset_5p, len(coverage) - offset_5p)
-        )
-        from_stop = pd.Series(
-            np.array(coverage),
-            index=np.arange(offset_3p - len(coverage) + 1, offset_3p + 1),
-        )
-
-    return (from_start, from_stop)
+        return (np.array(coverage), -offset_3p, offset_5p)
+    return (np.array(coverage), -offset_5p, offset_3p)
 
 
 def metagene_coverage(
@@ -157,41 +144,42 @@ def metagene_coverage(
         if reads < meta_min_reads:
             del read_lengths[length]
 
+    max_offset = max(offset_5p, offset_3p)
     for length in tqdm(read_lengths, unit="read-length", leave=False):
 
-        metagene_coverage_start = pd.Series()
-        position_counter_start = Counter()
-        metagene_coverage_stop = pd.Series()
-        position_counter_stop = Counter()
+        # normalized coverage summed over ORFs and the number of ORFs
+        # covering each position, relative to the start codon over
+        # [-max_offset, max_positions) and to the stop codon over
+        # (-max_positions, max_offset]
+        start_sum = np.zeros(max_positions + max_offset)
+        start_count = np.zeros(max_positions + max_offset, dtype=np.int64)
+        stop_sum = np.zeros(max_positions + max_offset)
+        stop_count = np.zeros(max_positions + max_offset, dtype=np.int64)
 
         for orf in tqdm(cds, position=1, unit="ORFs", leave=False):
-            from_start, from_stop = orf_coverage_length(
+            coverage, start_first, stop_last = orf_coverage_length(
                 orf, alignments, length, max_positions, offset_5p, offset_3p
             )
-            cov_mean = from_start.mean()
+            cov_mean = coverage.mean()
             if cov_mean > 0:
-                from_start = from_start / cov_mean
-                from_start = from_start.fillna(0)
-                metagene_coverage_start = metagene_coverage_start.add(
-                    from_start, fill_value=0
-                )
-                position_counter_start += Counter(from_start.index.tolist())
-
-                from_stop = from_stop / cov_mean
-                from_stop = from_stop.fillna(0)
-                metagene_coverage_stop = metagene_coverage_stop.add(
-                    from_stop, fill_value=0
-                )
-                position_counter_stop += Counter(from_stop.index.tolist())
-
-        if len(position_counter_start) != len(metagene_coverage_start) or len(
-            position_counter_stop
-        ) != len(metagene_coverage_stop):
-            raise RuntimeError("Metagene coverage and counter mismatch")
-        position_counter_start = pd.Series(position_counter_start)
-        metagene_coverage_start = metagene_coverage_start.div(position_counter_start)
-        position_counter_stop = pd.Series(position_counter_stop)
-        metagene_coverage_stop = metagene_coverage_stop.div(position_counter_stop)
+                normalized = coverage / cov_mean
+                first = start_first + max_offset
+                start_sum[first : first + len(coverage)] += normalized
+                start_count[first : first + len(coverage)] += 1
+                last = stop_last + max_positions - 1
+                stop_sum[last - len(coverage) + 1 : last + 1] += normalized
+                stop_count[last - len(coverage) + 1 : last + 1] += 1
+
+        covered = start_count > 0
+        metagene_coverage_start = pd.Series(
+            start_sum[covered] / start_count[covered],
+            index=np.arange(-max_offset, max_positions)[covered],
+        )
+        covered = stop_count > 0
+        metagene_coverage_stop = pd.Series(
+            stop_sum[covered] / stop_count[covered],
+            index=np.arange(-max_positions + 1, max_offset + 1)[covered],
+        )
 
         phasescore_5p, valid_5p = phasescore(metagene_coverage_start.tolist())
         phasescore_3p, valid_3p = phasescore(metagene_coverage_stop.tolist())
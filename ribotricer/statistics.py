@@ -21,6 +21,13 @@ import numpy as np
 from scipy import stats
 from scipy import signal
 
+try:
+    from numba import njit, prange
+
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    _NUMBA_AVAILABLE = False
+
 
 def pvalue(x, N):
     """Calculate p-value for phase score
@@ -109,3 +116,167 @@ def phasescore(original_values):
                 if valid == -1:
                     valid = length // 3
     return np.sqrt(coh), valid
+
+
+if _NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def _phasescore_kernel(values):
+        """Closed form of phasescore for a single signal.
+
+        With 3-point segments the coherence at frequency 1/3 reduces to
+        |sum of X|^2 / (n_codons * sum of |X|^2), X being the 1/3
+        frequency DFT term of each mean-centered normalized codon.
+        The score agrees with phasescore to about 1e-15, not bit for bit.
+
+        Also reports whether two frames scored within rounding error of
+        each other, in which case the frame picked by phasescore depends
+        on the exact floating point path and the caller should defer to it.
+        """
+        c2, c4 = cos(2 * pi / 3), cos(4 * pi / 3)
+        s2, s4 = sin(2 * pi / 3), sin(4 * pi / 3)
+        coh, valid = 0.0, -1
+        scores = np.full(3, np.nan)
+        for frame in range(3):
+            sum_real = sum_image = sum_power = 0.0
+            n_codons = 0
+            i = frame
+            while i + 2 < len(values):
+                v0, v1, v2 = values[i], values[i + 1], values[i + 2]
+                i += 3
+                if v0 == 0 and v1 == 0 and v2 == 0:
+                    continue
+                real = v0 + v1 * c2 + v2 * c4
+                image = v1 * s2 + v2 * s4
+                norm = sqrt(real ** 2 + image ** 2)
+                if norm == 0:
+                    norm = 1.0
+                u0, u1, u2 = v0 / norm, v1 / norm, v2 / norm
+                mean = (u0 + u1 + u2) / 3
+                u0, u1, u2 = u0 - mean, u1 - mean, u2 - mean
+                real = u0 - 0.5 * (u1 + u2)
+                image = s2 * (u2 - u1)
+                sum_real += real
+                sum_image += image
+                sum_power += real ** 2 + image ** 2
+                n_codons += 1
+            if n_codons == 0:
+                coh, valid = 0.0, 0
+            else:
+                # zero power gives an undefined coherence,
+                # which is never picked
+                if sum_power > 0:
+                    periodicity_score = (sum_real ** 2 + sum_image ** 2) / (
+                        n_codons * sum_power
+                    )
+                    scores[frame] = periodicity_score
+                    if periodicity_score > coh:
+                        coh = periodicity_score
+                        valid = n_codons
+                if valid == -1:
+                    valid = n_codons
+        tie = False
+        for frame in range(3):
+            for other in range(frame + 1, 3):
+                if abs(scores[frame] - scores[other]) <= 1e-12:
+                    tie = True
+        return sqrt(coh), valid, tie
+
+    @njit(parallel=True, cache=True)
+    def _orf_phasescore_kernel(
+        coverage,
+        starts,
+        ends,
+        offsets,
+        reverse,
+        out_coh,
+        out_valid,
+        out_tie,
+        out_count,
+        out_length,
+        out_min_codon,
+    ):
+        for k in prange(len(offsets) - 1):
+            length = 0
+            for j in range(offsets[k], offsets[k + 1]):
+                length += ends[j] - starts[j] + 1
+            values = np.zeros(length, dtype=np.int32)
+            filled = 0
+            for j in range(offsets[k], offsets[k + 1]):
+                for pos in range(starts[j], ends[j] + 1):
+                    if pos >= 0 and pos < len(coverage):
+                        values[filled] = coverage[pos]
+                    filled += 1
+            if reverse:
+                values = values[::-1]
+            coh, valid, tie = _phasescore_kernel(values)
+            count = 0
+            min_codon = 0
+            for i in range(0, length, 3):
+                codon = 0
+                for pos in range(i, min(i + 3, length)):
+                    codon += values[pos]
+                count += codon
+                if i == 0 or codon < min_codon:
+                    min_codon = codon
+            out_coh[k] = coh
+            out_valid[k] = valid
+            out_tie[k] = tie
+            out_count[k] = count
+            out_length[k] = length
+            out_min_codon[k] = min_codon
+
+
+def orf_phasescores(coverage, starts, ends, offsets, reverse):
+    """Score ORFs straight from a chromosome's coverage array.
+
+    Gathers, scores and summarizes every ORF in one numba pass,
+    without building a per-ORF coverage array on the Python side.
+    That only pays off for ORFs the caller then discards: reported
+    phase scores still have to come from phasescore, which needs the
+    coverage. Only available if numba is installed.
+
+    Parameters
+    ----------
+    coverage : np.ndarray
+               dense coverage of one chromosome and strand
+    starts, ends : np.ndarray
+                   inclusive bounds of all intervals,
+                   positions beyond the array count as zero
+    offsets : np.ndarray
+              ORF k spans intervals offsets[k] to offsets[k + 1]
+    reverse : bool
+              whether the ORFs are on the reverse strand
+
+    Returns
+    -------
+    coh, valid, tie, count, length, min_codon : np.ndarray
+        phase score, valid codons, whether phasescore should be
+        deferred to (see _phasescore_kernel), read count, length
+        and lowest codon coverage of each ORF. The phase scores are
+        only accurate to rounding error, reported values should come
+        from phasescore.
+    """
+    if not _NUMBA_AVAILABLE:
+        raise ImportError("orf_phasescores requires numba")
+    n_orfs = len(offsets) - 1
+    out_coh = np.zeros(n_orfs, dtype=np.float64)
+    out_valid = np.zeros(n_orfs, dtype=np.int64)
+    out_tie = np.zeros(n_orfs, dtype=np.bool_)
+    out_count = np.zeros(n_orfs, dtype=np.int64)
+    out_length = np.zeros(n_orfs, dtype=np.int64)
+    out_min_codon = np.zeros(n_orfs, dtype=np.int64)
+    _orf_phasescore_kernel(
+        coverage,
+        starts,
+        ends,
+        offsets,
+        reverse,
+        out_coh,
+        out_valid,
+        out_tie,
+        out_count,
+        out_length,
+        out_min_codon,
+    )
+    return out_coh, out_valid, out_tie, out_count, out_length, out_min_codon